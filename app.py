@@ -6,6 +6,7 @@ from src.chatbot import Chatbot
 from src.document import Document
 from src.sql import SQL
 from src.access import WebAccess
+from src.chat_history import show_gateway_metrics
 
 warnings.filterwarnings("ignore")
 st.set_page_config(page_title="Langchain",
@@ -19,6 +20,7 @@ if 'messages' not in st.session_state:
  
 tabs = ["Chatbot","Internet", "Document","Access","SQL","About"]
 page = st.sidebar.radio("Tabs", tabs)
+show_gateway_metrics()
 if __name__ == "__main__":
     if page == 'Chatbot' or page == 'Access' or page == 'Document':
         memory = st.selectbox(
@@ -6,6 +6,40 @@ class Path:
 
     sql_path: The MSSQL driver connection path.
     pdf_save_path: The pdf path that the chatbot uses to analyze
+    index_cache_path: The folder where background indexing jobs persist their chunks and embeddings
+    indexing_workers: The number of indexing jobs that may run at the same time
+    indexing_batch_size: The number of chunks embedded and made searchable per step
+    indexing_max_jobs: The number of indexing jobs kept in memory before finished ones are evicted
+    website_cache_ttl: The seconds after which websites are scraped and indexed again
+    embedding_model: The GPT4All embedding model, also part of the folder the embeddings are persisted in
+    embedding_quantization: The first-pass search encoding of chunk embeddings, 'int8', 'binary' or None for full precision
+    rescore_multiplier: How many candidates per result are rescored with full precision ('binary' needs a larger one)
+    chain_cache_entries: The number of conversational chains kept in the Streamlit cache
+    condense_model: A lighter Ollama model used to condense follow-up questions, or None to use the chat model
+    ollama_base_url: The URL of the Ollama server all LLM requests are sent to
+    llm_max_concurrency: The number of LLM requests sent to Ollama at the same time
+    llm_keep_alive: How long Ollama keeps a model loaded after a request
+    llm_warm_interval: The idle seconds after which a model is pinged to keep it loaded
+    llm_queue_timeout: The seconds an LLM request may wait for a free slot
+    llm_request_timeout: The seconds to wait for Ollama to connect or to send the next streamed chunk; not a limit on the whole request
+    batch_queue_timeout: The seconds a batch question may wait for a free LLM slot behind interactive requests
     """
     sql_path = 'mssql+pyodbc://DESKTOP-GU7QGA2\\MAHMUTYAVUZ/etrade?driver=ODBC+Driver+17+for+SQL+Server&trusted_connection=yes'
-    pdf_save_path = 'pdf_chatbot'
\ No newline at end of file
+    pdf_save_path = 'pdf_chatbot'
+    index_cache_path = 'index_cache'
+    indexing_workers = 1
+    indexing_batch_size = 32
+    indexing_max_jobs = 8
+    website_cache_ttl = 3600
+    embedding_model = 'all-MiniLM-L6-v2.gguf2.f16.gguf'
+    embedding_quantization = 'int8'
+    rescore_multiplier = 4
+    chain_cache_entries = 4
+    condense_model = None
+    ollama_base_url = 'http://localhost:11434'
+    llm_max_concurrency = 2
+    llm_keep_alive = '30m'
+    llm_warm_interval = 20 * 60
+    llm_queue_timeout = 120
+    llm_request_timeout = 600
+    batch_queue_timeout = 30 * 60
@@ -5,12 +5,11 @@ import validators
 import traceback
 import requests
 from langchain_core.documents.base import Document
-from langchain.chains import ConversationalRetrievalChain
-from langchain_community.vectorstores import DocArrayInMemorySearch
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import GPT4AllEmbeddings
 from src.chat_history import *
+from src.indexing import DONE, JobRetriever, content_key, get_indexing_queue
+from src.retrieval_chat import FastConversationalRetrievalChain
 from langchain_community.callbacks import StreamlitCallbackHandler
+from paths import Path
 
 class WebAccess:
     """
@@ -55,39 +54,37 @@ class WebAccess:
             traceback.print_exc()
         return content
 
-    @st.cache_resource(show_spinner='Analyzing webpage', ttl=3600)
-    def setup_vectordb(_self,websites):
+    def submit_indexing(self,websites):
         """
-        Sets up the vector database by scraping and loading content from the provided websites.
+        Queues the provided websites for background scraping and indexing.
 
-        This method scrapes content from each URL, splits the text into chunks, and stores them 
-        in a vector database for efficient retrieval.
+        The same set of URLs maps to the same job, so a browser refresh returns the job 
+        that is already running or finished instead of scraping the websites again. Once 
+        the job is older than `Path.website_cache_ttl`, the websites are scraped and indexed 
+        again in the background while the finished job keeps answering questions.
 
         Args:
             websites (list): A list of website URLs to scrape and analyze.
 
         Returns:
-            DocArrayInMemorySearch: The vector database containing the split documents.
+            IndexingJob: The job indexing the websites.
         """
-        docs = []
-        for url in websites:
-            docs.append(Document(
-                page_content=_self.scrape_website(url),
-                metadata={"source":url}
+        key = content_key(*websites)
+
+        def load_documents():
+            docs = []
+            for url in websites:
+                docs.append(Document(
+                    page_content=self.scrape_website(url),
+                    metadata={"source":url}
+                    )
                 )
-            )
+            return docs
 
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        splits = text_splitter.split_documents(docs)
-        embedding_model = GPT4AllEmbeddings()
-        vectordb = DocArrayInMemorySearch.from_documents(splits,embedding_model)
-        return vectordb
-    
-    @st.cache_resource
-    def create_cr_chain(_self,_vectordb,opt,window_num=None):
+        return get_indexing_queue().submit(key, load_documents, ttl=Path.website_cache_ttl)
+
+    @st.cache_resource(max_entries=Path.chain_cache_entries)
+    def create_cr_chain(_self,job_key,opt,window_num=None):
         """
         Sets up the question-answering (QA) chain with a document retriever.
 
@@ -95,16 +92,17 @@ class WebAccess:
         a conversational retrieval chain using the selected memory option to handle user queries.
 
         Args:
-            vectordb (DocArrayInMemorySearch): The vector database containing the split documents.
+            job_key (str): The content key of the indexing job to search.
             opt (str): The type of memory to use, either 'ConversationBufferMemory' or 
                        'ConversationBufferWindowMemory'.
             window_num (int, optional): The number of conversation turns to remember 
                                         (only applicable for 'ConversationBufferWindowMemory').
 
         Returns:
-            ConversationalRetrievalChain: The configured conversational retrieval chain.
+            FastConversationalRetrievalChain: The configured conversational retrieval chain.
         """
-        retriever = _vectordb.as_retriever(
+        retriever = JobRetriever(
+            key=job_key,
             search_type='mmr',
             search_kwargs={'k':2, 'fetch_k':4}
         )
@@ -113,9 +111,10 @@ class WebAccess:
         elif opt == 'ConversationBufferWindowMemory':
             memory = ConversationBufferWindowMemory(k=int(window_num),memory_key='chat_history',output_key='answer',return_messages=True)
         
-        qa_chain = ConversationalRetrievalChain.from_llm(
+        qa_chain = FastConversationalRetrievalChain.from_llm(
             llm=_self.llm,
             retriever=retriever,
+            condense_question_llm=call_llm_model(Path.condense_model) if Path.condense_model else None,
             memory=memory,
             return_source_documents=True,
             verbose=False
@@ -127,8 +126,9 @@ class WebAccess:
         """
         Main function to handle user interactions and web-based question-answering.
 
-        This method allows the user to input website URLs, scrapes the content, stores 
-        it in a vector database, and then processes user queries based on the scraped content. 
+        This method allows the user to input website URLs, scrapes and indexes the content 
+        in the background, and then processes user queries based on the scraped content as 
+        soon as the first chunks are searchable. 
         It displays both the answers and relevant references in the Streamlit chat interface.
 
         Args:
@@ -162,8 +162,14 @@ class WebAccess:
         else:
             st.sidebar.info("Websites - \n - {}".format('\n - '.join(websites)))
 
-            vectordb = self.setup_vectordb(websites)
-            qa_chain = self.create_cr_chain(vectordb,opt,window_num)
+            job = self.submit_indexing(websites)
+            show_indexing_progress(job, get_indexing_queue())
+            if job.indexed == 0:
+                if job.status == DONE:
+                    st.error("No content could be scraped from the websites!")
+                st.stop()
+            show_index_stats(job.vectordb)
+            qa_chain = self.create_cr_chain(job.key,opt,window_num)
 
             user_query = st.chat_input(placeholder="Ask me anything!")
             if websites and user_query:
@@ -179,6 +185,7 @@ class WebAccess:
                     
                     response = result["answer"]
                     st.session_state.messages.append({"role": "assistant", "content": response})
+                    st.caption(f"LLM calls: {result['llm_calls']}")
 
                     for idx, doc in enumerate(result['source_documents'],1):
                         url = os.path.basename(doc.metadata['source'])
@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from langchain.chains.question_answering import load_qa_chain
+from langchain_community.document_loaders import PyPDFLoader
+from src.indexing import DONE, content_key, get_indexing_queue
+from src.llm_gateway import BATCH_PRIORITY, GatewayChatModel, get_llm_gateway
+from paths import Path
+
+
+class BatchQA:
+    """
+    A class to answer many questions against the same PDF corpus without the chat UI.
+
+    The corpus is indexed through the shared indexing queue, so a corpus that was already
+    indexed is loaded from the index cache. All questions are embedded in one pass and
+    retrieved for together with the same MMR search as the chat, then the answers are
+    generated on a bounded thread pool whose LLM requests go through the Ollama gateway
+    with batch priority.
+
+    The priority only orders requests within one process: inside the app, interactive
+    users are served before batch questions. The command line runs in its own process
+    with its own gateway, so it shares the Ollama server with the app without priority,
+    and the two together may send up to twice `Path.llm_max_concurrency` requests.
+    """
+    def __init__(self, model="llama3.1", k=2, fetch_k=4, workers=None):
+        """
+        Initializes the BatchQA class.
+
+        Args:
+            model (str, optional): The Ollama model used to answer. Defaults to "llama3.1".
+            k (int, optional): The number of chunks retrieved per question.
+            fetch_k (int, optional): The number of candidates the k chunks are selected
+                                     from by maximal marginal relevance.
+            workers (int, optional): The number of answers generated at the same time.
+                                     Defaults to `Path.llm_max_concurrency`.
+        """
+        get_llm_gateway().keep_warm(model)
+        self.llm = GatewayChatModel(model=model, priority=BATCH_PRIORITY, timeout=Path.batch_queue_timeout)
+        self.qa_chain = load_qa_chain(self.llm, chain_type="stuff")
+        self.k = k
+        self.fetch_k = fetch_k
+        self.workers = workers or Path.llm_max_concurrency
+
+    def index_corpus(self, pdf_paths):
+        """
+        Indexes the given PDF files and waits until they are fully searchable.
+
+        Args:
+            pdf_paths (list): The paths of the PDF files of the corpus.
+
+        Returns:
+            QuantizedInMemorySearch: The vector database of the corpus.
+
+        Raises:
+            RuntimeError: If the indexing job does not finish.
+        """
+        contents = []
+        for pdf_path in pdf_paths:
+            with open(pdf_path, 'rb') as f:
+                contents.append(f.read())
+
+        def load_documents():
+            docs = []
+            for pdf_path in pdf_paths:
+                docs.extend(PyPDFLoader(pdf_path).load())
+            return docs
+
+        job = get_indexing_queue().submit(content_key(*contents), load_documents)
+        while job.is_active:
+            print(f"\rIndexing corpus.. {job.indexed}/{job.total} chunks", end='', file=sys.stderr)
+            time.sleep(0.5)
+        print(file=sys.stderr)
+        if job.status != DONE:
+            raise RuntimeError(f"Indexing the corpus {job.status}: {job.error}")
+        return job.vectordb
+
+    def retrieve(self, vectordb, questions):
+        """
+        Retrieves the relevant chunks for all questions at once.
+
+        Like the chat retriever, the chunks are selected by maximal marginal relevance
+        among the `fetch_k` most similar ones, with the first pass batched over all questions.
+
+        Args:
+            vectordb (QuantizedInMemorySearch): The vector database of the corpus.
+            questions (list): The questions to answer.
+
+        Returns:
+            list: For each question, a list of (Document, cosine similarity) pairs.
+        """
+        if not questions:
+            return []
+        query_embeddings = np.asarray(vectordb.embedding.embed_documents(questions), dtype=np.float32)
+        return vectordb.max_marginal_relevance_search_with_score_by_vectors(
+            query_embeddings, k=self.k, fetch_k=self.fetch_k
+        )
+
+    def answer(self, question, results):
+        """
+        Generates the answer to one question from its retrieved chunks.
+
+        Args:
+            question (str): The question to answer.
+            results (list): The (Document, cosine similarity) pairs retrieved for it.
+
+        Returns:
+            dict: The question, the answer or the error, the sources and the LLM time.
+        """
+        record = {
+            'question': question,
+            'sources': [
+                {
+                    'source': os.path.basename(doc.metadata.get('source', '')),
+                    'page': doc.metadata.get('page'),
+                    'score': round(score, 4),
+                }
+                for doc, score in results
+            ],
+        }
+        start = time.perf_counter()
+        try:
+            result = self.qa_chain.invoke({"input_documents": [doc for doc, _ in results], "question": question})
+            record['answer'] = result['output_text']
+        except Exception as e:
+            record['error'] = str(e)
+        record['llm_seconds'] = round(time.perf_counter() - start, 3)
+        return record
+
+    def run(self, questions, pdf_paths, output_path):
+        """
+        Answers all questions against the corpus and writes the answers to a JSON Lines file.
+
+        Args:
+            questions (list): The questions to answer.
+            pdf_paths (list): The paths of the PDF files of the corpus.
+            output_path (str): The path of the output file, one JSON record per question.
+
+        Returns:
+            dict: The timings of the run and the throughput in questions per second.
+
+        Raises:
+            ValueError: If there are no questions.
+        """
+        if not questions:
+            raise ValueError("There are no questions to answer.")
+        start = time.perf_counter()
+        vectordb = self.index_corpus(pdf_paths)
+        indexed = time.perf_counter()
+        all_results = self.retrieve(vectordb, questions)
+        retrieved = time.perf_counter()
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                open(output_path, 'w', encoding='utf-8') as f:
+            for done, record in enumerate(executor.map(self.answer, questions, all_results), 1):
+                failed += 'error' in record
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                print(f"\rAnswered {done}/{len(questions)} questions", end='', file=sys.stderr)
+        print(file=sys.stderr)
+        finished = time.perf_counter()
+
+        return {
+            'questions': len(questions),
+            'failed': failed,
+            'indexing_seconds': round(indexed - start, 3),
+            'retrieval_seconds': round(retrieved - indexed, 3),
+            'answering_seconds': round(finished - retrieved, 3),
+            'total_seconds': round(finished - start, 3),
+            'questions_per_second': round(len(questions) / (finished - indexed), 3),
+        }
+
+
+def read_questions(path):
+    """
+    Reads questions from a text file with one question per line, or from a JSON Lines
+    file with a 'question' key per record.
+
+    Args:
+        path (str): The path of the question file.
+
+    Returns:
+        list: The questions, skipping empty lines.
+    """
+    questions = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            questions.append(json.loads(line)['question'] if path.endswith('.jsonl') else line)
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions against a PDF corpus.")
+    parser.add_argument('--questions', required=True, help="A .txt file with one question per line, or a .jsonl file with a 'question' key.")
+    parser.add_argument('--corpus', required=True, nargs='+', help="The PDF files to answer from.")
+    parser.add_argument('--output', default='answers.jsonl', help="The JSON Lines file the answers are written to.")
+    parser.add_argument('--model', default='llama3.1', help="The Ollama model used to answer.")
+    parser.add_argument('--k', type=int, default=2, help="The number of chunks retrieved per question.")
+    parser.add_argument('--fetch-k', type=int, default=4, help="The number of candidates the chunks are selected from.")
+    parser.add_argument('--workers', type=int, default=None, help="The number of answers generated at the same time.")
+    args = parser.parse_args()
+
+    questions = read_questions(args.questions)
+    if not questions:
+        parser.error(f"no questions found in {args.questions}")
+    summary = BatchQA(model=args.model, k=args.k, fetch_k=args.fetch_k, workers=args.workers).run(questions, args.corpus, args.output)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
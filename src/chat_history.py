@@ -1,5 +1,6 @@
 import streamlit as st
-from langchain_community.chat_models import ChatOllama
+from src.indexing import CANCELLED, EMBEDDING, FAILED
+from src.llm_gateway import GatewayChatModel, INTERACTIVE_PRIORITY, get_llm_gateway
 
 def clean_chat_history(func):
     """
@@ -36,17 +37,24 @@ def clean_chat_history(func):
         return func(*args, **kwargs)
     return process
 
-def call_llm_model():
+def call_llm_model(model="llama3.1", priority=INTERACTIVE_PRIORITY):
     """
     Configures the language model to be used for the chatbot.
 
-    This function initializes and returns an instance of the ChatOllama model 
-    from the LangChain community, specifying the model version to be used.
+    This function returns a chat model sending its requests through the shared 
+    Ollama gateway, which reuses connections, limits concurrent requests and keeps 
+    the model loaded, so creating it on every rerun is cheap.
+
+    Args:
+        model (str, optional): The Ollama model to use. Defaults to "llama3.1".
+        priority (int, optional): The scheduling priority of the model's requests, 
+                                  lower values are served first.
 
     Returns:
-        ChatOllama: An instance of the ChatOllama model configured with the specified version.
+        GatewayChatModel: A chat model configured with the specified version.
     """
-    llm = ChatOllama(model="llama3.1")
+    get_llm_gateway().keep_warm(model)
+    llm = GatewayChatModel(model=model, priority=priority)
     return llm
 
 def session_state_synchronize():
@@ -72,3 +80,83 @@ def show_message(msg, author):
         author (str): The role or name of the author (e.g., "assistant" or "user").
     """
     st.chat_message(author).write(msg)
+
+
+def show_indexing_progress(job, queue):
+    """
+    Displays the progress of a background indexing job in the Streamlit interface.
+
+    The progress is rendered in a fragment that refreshes itself while the job is active,
+    so the rest of the page stays usable. The whole app is rerun once the first chunks
+    become searchable or the job stops, and buttons allow the user to cancel the job or
+    to resume it from its last persisted batch.
+
+    Args:
+        job (IndexingJob): The job to display.
+        queue (IndexingQueue): The queue the job belongs to, used to resume it.
+    """
+    was_active = job.is_active
+    had_chunks = job.indexed > 0
+
+    @st.fragment(run_every=2 if was_active else None)
+    def progress():
+        if job.is_active != was_active or (job.indexed > 0) != had_chunks:
+            st.rerun()
+        if job.is_active:
+            if job.status == EMBEDDING:
+                text = f"Indexing documents.. {job.indexed}/{job.total} chunks searchable"
+            else:
+                text = "Loading documents.."
+            st.progress(job.progress, text=text)
+            if job.cancel_requested:
+                st.caption("Cancelling..")
+            elif st.button("Cancel indexing", key=f"cancel_{job.key}"):
+                job.cancel()
+        elif job.status in (CANCELLED, FAILED):
+            if job.status == FAILED:
+                st.warning(f"Indexing failed: {job.error}", icon="⚠️")
+            else:
+                st.warning(f"Indexing cancelled, {job.indexed}/{job.total} chunks searchable.", icon="⚠️")
+            if st.button("Resume indexing", key=f"resume_{job.key}"):
+                queue.resume(job)
+                st.rerun()
+
+    progress()
+
+
+def show_index_stats(vectordb):
+    """
+    Displays the embedding memory footprint of a vector database in the sidebar.
+
+    The RAM used by the quantized store is compared to an unquantized float32 store, and
+    a button measures the recall@k of the quantized search against exact search, using a
+    sample of the indexed chunks as queries.
+
+    Args:
+        vectordb (QuantizedInMemorySearch): The vector database to report on.
+    """
+    footprint = vectordb.memory_footprint()
+    with st.sidebar.expander('Index stats'):
+        st.caption(f"Chunks: {footprint['chunks']} - quantization: {footprint['quantization']}")
+        st.caption(
+            f"Embeddings in RAM: {(footprint['quantized_bytes'] + footprint['full_precision_ram_bytes']) / 1024:.1f} KiB "
+            f"(float32 baseline: {footprint['baseline_bytes'] / 1024:.1f} KiB, {footprint['compression']:.1f}x smaller)"
+        )
+        if st.button("Measure recall@4"):
+            st.caption(f"Recall@4 against exact search: {vectordb.recall_at_k(k=4):.3f}")
+
+
+
+def show_gateway_metrics():
+    """
+    Displays the queue metrics of the shared Ollama gateway in the sidebar.
+    """
+    metrics = get_llm_gateway().metrics()
+    with st.sidebar.expander('LLM gateway'):
+        st.caption(f"Queue depth: {metrics['queue_depth']} - in flight: {metrics['in_flight']}")
+        st.caption(f"Completed: {metrics['completed']} - timeouts: {metrics['timeouts']}")
+        st.caption(
+            f"Wait time: mean {metrics['wait_mean']:.2f}s, p95 {metrics['wait_p95']:.2f}s, "
+            f"max {metrics['wait_max']:.2f}s"
+        )
+        st.caption(f"Warm models: {', '.join(metrics['warm_models']) or '-'}")
@@ -1,12 +1,10 @@
 import streamlit as st
 from langchain.memory import ConversationBufferMemory, ConversationBufferWindowMemory
 import os
-from langchain.chains import ConversationalRetrievalChain
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import DocArrayInMemorySearch
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import GPT4AllEmbeddings
 from src.chat_history import *
+from src.indexing import DONE, JobRetriever, content_key, get_indexing_queue
+from src.retrieval_chat import FastConversationalRetrievalChain
 from langchain_community.callbacks import StreamlitCallbackHandler
 from paths import Path
 
@@ -50,42 +48,53 @@ class Document:
             f.write(file.getvalue())
         return file_path
     
-    @st.cache_resource
-    @st.spinner('Analyzing documents..')
-    def create_cr_chain(_self,uploaded_files,opt,window_num=None):
+    def submit_indexing(self,uploaded_files):
         """
-        Sets up the question-answering chain with document retrieval capabilities.
+        Queues the uploaded documents for background indexing.
 
-        This method loads the uploaded documents, splits them into chunks, stores them
-        in a vector database, and configures a retriever for searching relevant content.
-        It also initializes a conversational retrieval chain using the selected memory 
-        option to handle user queries.
+        Identical documents map to the same job, so a browser refresh or a repeated upload
+        returns the job that is already running or finished instead of starting over.
 
         Args:
             uploaded_files (list): A list of uploaded PDF files from the user.
+
+        Returns:
+            IndexingJob: The job indexing the uploaded documents.
+        """
+        key = content_key(*[file.getvalue() for file in uploaded_files])
+
+        def load_documents():
+            docs = []
+            for file in uploaded_files:
+                file_path = self.save_file(file)
+                loader = PyPDFLoader(file_path)
+                docs.extend(loader.load())
+            return docs
+
+        return get_indexing_queue().submit(key, load_documents)
+
+    @st.cache_resource(max_entries=Path.chain_cache_entries)
+    def create_cr_chain(_self,job_key,opt,window_num=None):
+        """
+        Sets up the question-answering chain with document retrieval capabilities.
+
+        This method configures a retriever for searching the vector database filled by the
+        background indexing job, and initializes a conversational retrieval chain using the
+        selected memory option to handle user queries. Chunks indexed after the chain is
+        created are picked up by the retriever as well.
+
+        Args:
+            job_key (str): The content key of the indexing job to search.
             opt (str): The type of memory to use, either 'ConversationBufferMemory' or 
                        'ConversationBufferWindowMemory'.
             window_num (int, optional): The number of conversation turns to remember 
                                         (only applicable for 'ConversationBufferWindowMemory').
 
         Returns:
-            ConversationalRetrievalChain: The configured conversational retrieval chain.
+            FastConversationalRetrievalChain: The configured conversational retrieval chain.
         """
-        docs = []
-        for file in uploaded_files:
-            file_path = _self.save_file(file)
-            loader = PyPDFLoader(file_path)
-            docs.extend(loader.load())
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200
-        )
-        splits = text_splitter.split_documents(docs)
-        embedding_model = GPT4AllEmbeddings()
-        vectordb = DocArrayInMemorySearch.from_documents(splits, embedding_model)
-
-        retriever = vectordb.as_retriever(
+        retriever = JobRetriever(
+            key=job_key,
             search_type='mmr',
             search_kwargs={'k':2, 'fetch_k':4}
         )
@@ -94,9 +103,10 @@ class Document:
         elif opt == 'ConversationBufferWindowMemory':
             memory = ConversationBufferWindowMemory(k=int(window_num),memory_key='chat_history',output_key='answer',return_messages=True)
 
-        qa_chain = ConversationalRetrievalChain.from_llm(
+        qa_chain = FastConversationalRetrievalChain.from_llm(
             llm=_self.llm,
             retriever=retriever,
+            condense_question_llm=call_llm_model(Path.condense_model) if Path.condense_model else None,
             memory=memory,
             return_source_documents=True,
             verbose=False
@@ -108,9 +118,10 @@ class Document:
         """
         Main function to handle user interactions and document-based question-answering.
 
-        This method allows the user to upload PDF documents and enter queries. It uses the 
-        configured QA chain to retrieve answers from the documents' content and displays 
-        both the answer and relevant references in the Streamlit chat interface.
+        This method allows the user to upload PDF documents and enter queries. The documents 
+        are indexed in the background and queries are accepted as soon as the first chunks 
+        are searchable. It uses the configured QA chain to retrieve answers from the documents' 
+        content and displays both the answer and relevant references in the Streamlit chat interface.
 
         Args:
             memory (str): The type of memory to use for conversation management.
@@ -122,10 +133,18 @@ class Document:
             st.error("Please upload PDF documents to continue!")
             st.stop()
 
+        job = self.submit_indexing(uploaded_files)
+        show_indexing_progress(job, get_indexing_queue())
+        if job.indexed == 0:
+            if job.status == DONE:
+                st.error("No text could be extracted from the uploaded documents!")
+            st.stop()
+        show_index_stats(job.vectordb)
+
         user_query = st.chat_input(placeholder="Ask me anything!")
 
         if uploaded_files and user_query:
-            qa_chain = self.create_cr_chain(uploaded_files,memory,window_num)
+            qa_chain = self.create_cr_chain(job.key,memory,window_num)
             st.session_state.messages.append({"role": "user", "content": user_query})
             show_message(user_query, 'user')
             with st.chat_message("assistant"):
@@ -137,6 +156,7 @@ class Document:
                 )
                 response = result["answer"]
                 st.session_state.messages.append({"role": "assistant", "content": response})
+                st.caption(f"LLM calls: {result['llm_calls']}")
 
                 for idx, doc in enumerate(result['source_documents'],1):
                     filename = os.path.basename(doc.metadata['source'])
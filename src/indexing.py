@@ -0,0 +1,500 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Any, List
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents.base import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.pydantic_v1 import Field
+from langchain_core.retrievers import BaseRetriever
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.embeddings import GPT4AllEmbeddings
+from src.vectorstore import QuantizedInMemorySearch
+from paths import Path
+
+QUEUED = 'queued'
+LOADING = 'loading'
+EMBEDDING = 'embedding'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+
+def _new_generation():
+    return f'{time.time_ns():020d}'
+
+
+def _latest_generation(key):
+    """
+    Returns the most recent cache generation of a content key, or a new one if there is none.
+    """
+    folder = os.path.join(Path.index_cache_path, key)
+    if os.path.isdir(folder):
+        generations = sorted(name for name in os.listdir(folder) if name.isdigit())
+        if generations:
+            return generations[-1]
+    return _new_generation()
+
+
+def content_key(*parts):
+    """
+    Builds a stable key that identifies a set of contents.
+
+    Each part is hashed separately and the digests are sorted before being combined,
+    so the same files or URLs give the same key regardless of their order.
+
+    Args:
+        *parts (bytes or str): The contents to identify, e.g. raw PDF bytes or URLs.
+
+    Returns:
+        str: A hexadecimal SHA-256 key.
+    """
+    digests = []
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digests.append(hashlib.sha256(part).hexdigest())
+    return hashlib.sha256('\n'.join(sorted(digests)).encode('utf-8')).hexdigest()
+
+
+class LockedEmbeddings(Embeddings):
+    """
+    Serializes the calls to an embedding model that is not safe to use from several threads.
+
+    Indexing workers embed chunks while the Streamlit thread embeds questions against the
+    chunks already indexed, so every call goes through one lock.
+    """
+    def __init__(self, embedding):
+        """
+        Initializes the LockedEmbeddings class.
+
+        Args:
+            embedding (Embeddings): The embedding model to guard.
+        """
+        self.embedding = embedding
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            return self.embedding.embed_documents(texts)
+
+    def embed_query(self, text):
+        with self._lock:
+            return self.embedding.embed_query(text)
+
+
+class BatchedGPT4AllEmbeddings(GPT4AllEmbeddings):
+    """
+    GPT4All embeddings computing a list of texts in one call to the model.
+
+    `GPT4AllEmbeddings.embed_documents` calls `Embed4All.embed` once per text, while
+    `Embed4All.embed` also accepts a list and embeds it as a single batch.
+    """
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return [list(map(float, e)) for e in self.client.embed(list(texts))]
+
+
+_embedding_model = None
+_embedding_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """
+    Returns the process-wide embedding model shared by every indexing job.
+
+    The GPT4All model is loaded once, embeds every list of texts as one batch, and is
+    wrapped in `LockedEmbeddings` so that indexing and question answering can use it at
+    the same time.
+
+    Returns:
+        LockedEmbeddings: The shared embedding model.
+    """
+    global _embedding_model
+    with _embedding_lock:
+        if _embedding_model is None:
+            _embedding_model = LockedEmbeddings(BatchedGPT4AllEmbeddings(model_name=Path.embedding_model))
+        return _embedding_model
+
+
+class IndexingJob:
+    """
+    A background job that loads, splits and embeds documents into a vector database.
+
+    Chunks become searchable batch by batch, so questions can be answered while the rest
+    of the job is still running. The chunks and the embeddings of every finished batch are
+    persisted under `Path.index_cache_path/<key>/<generation>`, which lets a cancelled or
+    interrupted job resume where it stopped instead of starting over. Embeddings are kept
+    in a subfolder named after the embedding model and the batch size, so changing either
+    never pairs a persisted batch with the wrong chunks.
+    """
+    def __init__(self, key, load_documents, generation):
+        """
+        Initializes the IndexingJob class.
+
+        The vector database is only created once the job runs, so queueing a job never
+        loads the embedding model on the caller's thread.
+
+        Args:
+            key (str): The content key of the job, see `content_key`.
+            load_documents (callable): A function without arguments returning the list of
+                                       documents to index.
+            generation (str): The cache generation of the job. A refresh of the same
+                              content uses a new generation, so it does not reuse the
+                              persisted chunks of the previous one.
+        """
+        self.key = key
+        self.load_documents = load_documents
+        self.generation = generation
+        self.folder = os.path.join(Path.index_cache_path, key, generation)
+        self.status = QUEUED
+        self.error = None
+        self.total = 0
+        self.indexed = 0
+        self.finished_at = None
+        self.vectordb = None
+        self._cancel_event = threading.Event()
+
+    @property
+    def progress(self):
+        """
+        float: The fraction of chunks that are already searchable.
+        """
+        if not self.total:
+            return 0.0
+        return self.indexed / self.total
+
+    @property
+    def is_active(self):
+        """
+        bool: Whether the job is queued or still running.
+        """
+        return self.status in (QUEUED, LOADING, EMBEDDING)
+
+    @property
+    def cancel_requested(self):
+        """
+        bool: Whether the job was asked to stop.
+        """
+        return self._cancel_event.is_set()
+
+    def is_stale(self, ttl):
+        """
+        Tells whether the job finished more than `ttl` seconds ago.
+
+        Args:
+            ttl (float): The number of seconds an index stays fresh.
+
+        Returns:
+            bool: True if the content should be indexed again.
+        """
+        return self.status == DONE and self.finished_at is not None and time.time() - self.finished_at >= ttl
+
+    def cancel(self):
+        """
+        Asks the job to stop after the batch it is currently embedding.
+        """
+        self._cancel_event.set()
+
+    def run(self):
+        """
+        Runs the job until it is done, cancelled or fails.
+
+        This method is executed by a worker of the `IndexingQueue`. Batches already
+        persisted by an earlier run of the same content are loaded from disk instead
+        of being embedded again.
+        """
+        if self._cancel_event.is_set():
+            self.status = CANCELLED
+            return
+        try:
+            self.status = LOADING
+            self.vectordb = QuantizedInMemorySearch(
+                get_embedding_model(),
+                quantization=Path.embedding_quantization,
+                rescore_multiplier=Path.rescore_multiplier
+            )
+            os.makedirs(self.folder, exist_ok=True)
+            splits = self._load_splits()
+            self.total = len(splits)
+
+            self.status = EMBEDDING
+            batch_size = Path.indexing_batch_size
+            embeddings_folder = os.path.join(self.folder, f'embeddings-{Path.embedding_model}-b{batch_size}')
+            os.makedirs(embeddings_folder, exist_ok=True)
+            for batch_num, start in enumerate(range(0, self.total, batch_size)):
+                if self._cancel_event.is_set():
+                    self.status = CANCELLED
+                    return
+                batch = splits[start:start + batch_size]
+                batch_path = os.path.join(embeddings_folder, f'batch_{batch_num:05d}.npy')
+                if not self._is_valid_batch(batch_path, len(batch)):
+                    embeddings = np.asarray(
+                        self.vectordb.embedding.embed_documents([doc.page_content for doc in batch]),
+                        dtype=np.float32
+                    )
+                    self._save_batch(batch_path, embeddings)
+                self._add_to_index(batch, batch_path)
+                self.indexed += len(batch)
+            self.finished_at = self._mark_done()
+            self.status = DONE
+        except Exception as e:
+            traceback.print_exc()
+            self.error = str(e)
+            self.status = FAILED
+
+    def _load_splits(self):
+        """
+        Loads the chunks of the job, from disk if an earlier run already split them.
+
+        Returns:
+            list: The split documents.
+        """
+        chunks_path = os.path.join(self.folder, 'chunks.json')
+        if os.path.exists(chunks_path):
+            with open(chunks_path, 'r', encoding='utf-8') as f:
+                return [Document(page_content=c['page_content'], metadata=c['metadata']) for c in json.load(f)]
+
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        )
+        splits = text_splitter.split_documents(self.load_documents())
+        tmp_path = chunks_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([{'page_content': doc.page_content, 'metadata': doc.metadata} for doc in splits], f)
+        os.replace(tmp_path, chunks_path)
+        return splits
+
+    def _is_valid_batch(self, batch_path, size):
+        """
+        Tells whether a persisted batch exists and holds one embedding per chunk of the batch.
+        """
+        if not os.path.exists(batch_path):
+            return False
+        return np.load(batch_path, mmap_mode='r').shape[0] == size
+
+    def _mark_done(self):
+        """
+        Records when the content was fully indexed, keeping the first time across resumes.
+
+        Returns:
+            float: The time the content was first fully indexed.
+        """
+        done_path = os.path.join(self.folder, 'done.json')
+        if os.path.exists(done_path):
+            with open(done_path, 'r', encoding='utf-8') as f:
+                return json.load(f)['finished_at']
+        finished_at = time.time()
+        with open(done_path, 'w', encoding='utf-8') as f:
+            json.dump({'finished_at': finished_at}, f)
+        return finished_at
+
+    def _save_batch(self, batch_path, embeddings):
+        """
+        Persists the embeddings of one batch, so a partially written file is never resumed from.
+        """
+        tmp_path = batch_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, embeddings)
+        os.replace(tmp_path, batch_path)
+
+    def _add_to_index(self, batch, batch_path):
+        """
+        Makes a batch of already embedded chunks searchable.
+
+        When the store is quantized, the persisted full-precision embeddings are memory-mapped
+        instead of loaded, so only the quantized codes take up RAM.
+        """
+        mmap_mode = 'r' if self.vectordb.quantization else None
+        self.vectordb.add_embeddings(
+            [doc.page_content for doc in batch],
+            np.load(batch_path, mmap_mode=mmap_mode),
+            [doc.metadata for doc in batch]
+        )
+
+
+class IndexingQueue:
+    """
+    A process-wide queue running `IndexingJob`s on background worker threads.
+
+    Jobs are deduplicated by their content key, so a browser refresh or a second user
+    uploading the same content gets the job that is already running. At most
+    `Path.indexing_max_jobs` jobs are kept in memory; the least recently used finished
+    jobs are evicted beyond that, and are reloaded from `Path.index_cache_path` if their
+    content is submitted again.
+
+    Content submitted with a time-to-live is indexed again in the background once its
+    job is older than that. The old job keeps answering questions until the refresh is
+    done, then the refresh replaces it and the old cache generation is deleted.
+    """
+    def __init__(self, max_workers=None):
+        """
+        Initializes the IndexingQueue class.
+
+        Args:
+            max_workers (int, optional): The number of jobs running at the same time.
+                                         Defaults to `Path.indexing_workers`.
+        """
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or Path.indexing_workers,
+            thread_name_prefix='indexing'
+        )
+        self._jobs = OrderedDict()
+        self._refreshing = {}
+        self._lock = threading.RLock()
+
+    def submit(self, key, load_documents, ttl=None):
+        """
+        Returns the job for the given content, queueing a new one if there is none yet.
+
+        Args:
+            key (str): The content key of the job, see `content_key`.
+            load_documents (callable): A function without arguments returning the list of
+                                       documents to index.
+            ttl (float, optional): The seconds after which finished content is indexed
+                                   again in the background. None never refreshes it.
+
+        Returns:
+            IndexingJob: The new or existing job.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._start(key, load_documents, _latest_generation(key))
+            else:
+                self._jobs.move_to_end(key)
+            if ttl is not None and key not in self._refreshing and job.is_stale(ttl):
+                self._refreshing[key] = self._start(key, load_documents, _new_generation(), refresh=True)
+            return job
+
+    def resume(self, job):
+        """
+        Restarts a cancelled or failed job from its last persisted batch.
+
+        Args:
+            job (IndexingJob): The job to restart.
+
+        Returns:
+            IndexingJob: The restarted job, or the current one if it is still active.
+        """
+        with self._lock:
+            current = self._jobs.get(job.key)
+            if current is not None and current.is_active:
+                return current
+            return self._start(job.key, job.load_documents, job.generation)
+
+    def get(self, key):
+        """
+        Returns the job for the given content key, or None if there is none.
+        """
+        with self._lock:
+            return self._jobs.get(key)
+
+    def _start(self, key, load_documents, generation, refresh=False):
+        job = IndexingJob(key, load_documents, generation)
+        if not refresh:
+            self._jobs[key] = job
+            self._jobs.move_to_end(key)
+            self._remove_generations(key, keep=generation)
+        self._executor.submit(job.run).add_done_callback(lambda _: self._job_finished(job))
+        self._evict()
+        return job
+
+    def _job_finished(self, job):
+        """
+        Swaps a finished refresh in for the job it refreshes, then evicts old jobs.
+        """
+        with self._lock:
+            if self._refreshing.get(job.key) is job:
+                del self._refreshing[job.key]
+                old = self._jobs.get(job.key)
+                if job.status == DONE and job.indexed > 0:
+                    self._jobs[job.key] = job
+                    self._remove_generations(job.key, keep=job.generation)
+                else:
+                    if old is not None:
+                        old.finished_at = time.time()
+                    shutil.rmtree(job.folder, ignore_errors=True)
+            self._evict()
+
+    def _remove_generations(self, key, keep):
+        """
+        Deletes the cache generations of a key other than `keep`.
+
+        Deletion is best effort: files still memory-mapped by a store that is being
+        replaced cannot be removed on every platform, and are retried on the next start.
+        """
+        folder = os.path.join(Path.index_cache_path, key)
+        if not os.path.isdir(folder):
+            return
+        for name in os.listdir(folder):
+            if name != keep and name.isdigit():
+                shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+
+    def _evict(self):
+        """
+        Drops the least recently used finished jobs beyond `Path.indexing_max_jobs`.
+
+        Jobs being refreshed are kept, so a new job never starts in the folder of a refresh.
+        Must be called with the queue lock held.
+        """
+        excess = len(self._jobs) - Path.indexing_max_jobs
+        evictable = [key for key, job in self._jobs.items() if not job.is_active and key not in self._refreshing]
+        for key in evictable[:max(excess, 0)]:
+            del self._jobs[key]
+
+
+class JobRetriever(BaseRetriever):
+    """
+    A retriever searching whichever job currently indexes a content key.
+
+    Chains built on this retriever keep working, and keep their conversation memory, when
+    the job of their content is resumed, reloaded after eviction or replaced by a refresh,
+    and they do not keep a replaced vector database alive.
+    """
+    key: str
+    """The content key of the indexing job to search."""
+    search_type: str = 'mmr'
+    """Either 'mmr' or 'similarity'."""
+    search_kwargs: dict = Field(default_factory=dict)
+    """The keyword arguments passed to the search method, e.g. {'k': 2, 'fetch_k': 4}."""
+    queue: Any = None
+    """The queue holding the job, defaults to the process-wide queue."""
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        job = (self.queue or get_indexing_queue()).get(self.key)
+        if job is None or job.vectordb is None or job.indexed == 0:
+            return []
+        if self.search_type == 'mmr':
+            return job.vectordb.max_marginal_relevance_search(query, **self.search_kwargs)
+        return job.vectordb.similarity_search(query, **self.search_kwargs)
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_indexing_queue():
+    """
+    Returns the process-wide `IndexingQueue`.
+
+    The queue is kept at module level rather than in `st.cache_resource`, because the
+    cache is cleared whenever the user switches pages, while jobs must keep running.
+
+    Returns:
+        IndexingQueue: The shared indexing queue.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = IndexingQueue()
+        return _queue
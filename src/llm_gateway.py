@@ -0,0 +1,342 @@
+import json
+import heapq
+import time
+import itertools
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, ChatMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from paths import Path
+
+INTERACTIVE_PRIORITY = 0
+BATCH_PRIORITY = 10
+WARMUP_PRIORITY = 100
+
+
+class GatewayTimeout(TimeoutError):
+    """
+    Raised when a request waits longer than its timeout for a free slot of the gateway.
+    """
+
+
+class RequestScheduler:
+    """
+    Admits at most `max_concurrency` requests at a time, in priority order.
+
+    Waiting requests are served by increasing priority value and, for equal priorities,
+    in arrival order. Wait times are recorded to report queue metrics.
+    """
+    def __init__(self, max_concurrency):
+        """
+        Initializes the RequestScheduler class.
+
+        Args:
+            max_concurrency (int): The number of requests allowed to run at the same time.
+        """
+        self.max_concurrency = max_concurrency
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._running = 0
+        self._completed = 0
+        self._timeouts = 0
+        self._wait_times = deque(maxlen=1000)
+
+    @contextmanager
+    def slot(self, priority=INTERACTIVE_PRIORITY, timeout=None):
+        """
+        Waits for a free slot and holds it while the `with` block runs.
+
+        Args:
+            priority (int, optional): Lower values are served first.
+            timeout (float, optional): The maximum number of seconds to wait for a slot.
+
+        Raises:
+            GatewayTimeout: If no slot became free within the timeout.
+        """
+        ticket = (priority, next(self._seq))
+        started = time.monotonic()
+        deadline = None if timeout is None else started + timeout
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while self._running >= self.max_concurrency or self._waiting[0] != ticket:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._timeouts += 1
+                        raise GatewayTimeout(f"No free LLM slot after waiting {timeout} seconds")
+                    self._cond.wait(remaining)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._running += 1
+            self._wait_times.append(time.monotonic() - started)
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._completed += 1
+                self._cond.notify_all()
+
+    def metrics(self):
+        """
+        Returns the current queue metrics.
+
+        Returns:
+            dict: The queue depth, the requests in flight, the completed and timed out
+                  requests, and the mean, 95th percentile and maximum wait times in seconds
+                  over the most recent requests.
+        """
+        with self._cond:
+            wait_times = sorted(self._wait_times)
+            metrics = {
+                'queue_depth': len(self._waiting),
+                'in_flight': self._running,
+                'completed': self._completed,
+                'timeouts': self._timeouts,
+            }
+        if wait_times:
+            metrics['wait_mean'] = sum(wait_times) / len(wait_times)
+            metrics['wait_p95'] = wait_times[min(len(wait_times) - 1, int(len(wait_times) * 0.95))]
+            metrics['wait_max'] = wait_times[-1]
+        else:
+            metrics['wait_mean'] = metrics['wait_p95'] = metrics['wait_max'] = 0.0
+        return metrics
+
+
+class OllamaGateway:
+    """
+    A shared client for the Ollama HTTP API.
+
+    All requests go through one pooled `requests.Session`, so connections are reused, and
+    through a `RequestScheduler`, so concurrent users cannot overload the server. Every
+    request asks Ollama to keep the model loaded for `keep_alive`, and models registered
+    with `keep_warm` are pinged in the background when they have been idle for
+    `warm_interval` seconds, which avoids cold starts after an unload.
+    """
+    def __init__(self, base_url=None, max_concurrency=None, keep_alive=None, warm_interval=None,
+                 queue_timeout=None, request_timeout=None):
+        """
+        Initializes the OllamaGateway class.
+
+        Every argument defaults to the matching `Path.ollama_*` or `Path.llm_*` setting.
+
+        Args:
+            base_url (str, optional): The URL of the Ollama server.
+            max_concurrency (int, optional): The number of requests sent at the same time.
+            keep_alive (str, optional): How long Ollama keeps a model loaded, e.g. '30m'.
+            warm_interval (float, optional): The idle seconds after which a model is pinged.
+            queue_timeout (float, optional): The seconds a request may wait for a slot.
+            request_timeout (float, optional): The seconds to wait for the connection or for
+                                               the next streamed chunk. It is not a limit
+                                               on the whole request, which may stream for
+                                               longer.
+        """
+        self.base_url = (base_url or Path.ollama_base_url).rstrip('/')
+        self.keep_alive = keep_alive or Path.llm_keep_alive
+        self.warm_interval = warm_interval or Path.llm_warm_interval
+        self.queue_timeout = queue_timeout or Path.llm_queue_timeout
+        self.request_timeout = request_timeout or Path.llm_request_timeout
+        max_concurrency = max_concurrency or Path.llm_max_concurrency
+        self.scheduler = RequestScheduler(max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._last_used = {}
+        self._warm_models = set()
+        self._warm_lock = threading.Lock()
+        self._warm_thread = None
+
+    def chat(self, model, messages, options=None, priority=INTERACTIVE_PRIORITY, timeout=None, on_token=None):
+        """
+        Sends a chat request and returns the full response text.
+
+        Args:
+            model (str): The Ollama model to use.
+            messages (list): The messages as dicts with 'role' and 'content' keys.
+            options (dict, optional): Ollama model options, e.g. {'stop': [...]}.
+            priority (int, optional): Lower values are served first.
+            timeout (float, optional): The seconds to wait for a slot, defaults to
+                                       `queue_timeout`.
+            on_token (callable, optional): Called with every streamed token.
+
+        Returns:
+            str: The generated message content.
+
+        Raises:
+            GatewayTimeout: If no slot became free within the timeout.
+        """
+        payload = {
+            'model': model,
+            'messages': messages,
+            'stream': True,
+            'keep_alive': self.keep_alive,
+            'options': options or {},
+        }
+        with self.scheduler.slot(priority, timeout or self.queue_timeout):
+            with self.session.post(f'{self.base_url}/api/chat', json=payload, stream=True,
+                                   timeout=self.request_timeout) as response:
+                response.raise_for_status()
+                content = []
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if 'error' in chunk:
+                        raise ValueError(f"Ollama error: {chunk['error']}")
+                    token = chunk.get('message', {}).get('content', '')
+                    if token:
+                        content.append(token)
+                        if on_token:
+                            on_token(token)
+                    if chunk.get('done'):
+                        break
+            self._last_used[model] = time.monotonic()
+        return ''.join(content)
+
+    def warm_up(self, model, timeout=None):
+        """
+        Loads a model into memory without generating anything.
+
+        The request has the lowest priority, so it never delays user requests.
+
+        Args:
+            model (str): The Ollama model to load.
+            timeout (float, optional): The seconds to wait for a slot.
+        """
+        payload = {'model': model, 'keep_alive': self.keep_alive}
+        with self.scheduler.slot(WARMUP_PRIORITY, timeout or self.queue_timeout):
+            response = self.session.post(f'{self.base_url}/api/generate', json=payload,
+                                         timeout=self.request_timeout)
+            response.raise_for_status()
+            self._last_used[model] = time.monotonic()
+
+    def keep_warm(self, model):
+        """
+        Registers a model to be loaded now and kept loaded while the app runs.
+
+        Args:
+            model (str): The Ollama model to keep warm.
+        """
+        with self._warm_lock:
+            if model in self._warm_models:
+                return
+            self._warm_models.add(model)
+            self._last_used.setdefault(model, float('-inf'))
+            if self._warm_thread is None:
+                self._warm_thread = threading.Thread(target=self._keep_warm_loop, name='ollama-keep-warm',
+                                                     daemon=True)
+                self._warm_thread.start()
+
+    def _keep_warm_loop(self):
+        while True:
+            with self._warm_lock:
+                models = list(self._warm_models)
+            for model in models:
+                if time.monotonic() - self._last_used.get(model, float('-inf')) >= self.warm_interval:
+                    try:
+                        self.warm_up(model, timeout=self.warm_interval)
+                    except GatewayTimeout:
+                        pass
+                    except Exception:
+                        traceback.print_exc()
+                        self._last_used[model] = time.monotonic()
+            time.sleep(min(self.warm_interval, 30))
+
+    def metrics(self):
+        """
+        Returns the queue metrics of the gateway and the models kept warm.
+
+        Returns:
+            dict: The metrics of `RequestScheduler.metrics` plus 'warm_models'.
+        """
+        metrics = self.scheduler.metrics()
+        with self._warm_lock:
+            metrics['warm_models'] = sorted(self._warm_models)
+        return metrics
+
+
+class GatewayChatModel(BaseChatModel):
+    """
+    A LangChain chat model sending its requests through the shared `OllamaGateway`.
+    """
+    model: str = "llama3.1"
+    """The Ollama model to use."""
+    priority: int = INTERACTIVE_PRIORITY
+    """The scheduling priority of this model's requests, lower values are served first."""
+    timeout: Optional[float] = None
+    """The seconds a request may wait for a slot, defaults to the gateway setting."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "ollama-gateway"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        options = {'stop': stop} if stop else None
+        on_token = run_manager.on_llm_new_token if run_manager else None
+        text = get_llm_gateway().chat(
+            self.model,
+            [_convert_message(message) for message in messages],
+            options=options,
+            priority=self.priority,
+            timeout=self.timeout,
+            on_token=on_token,
+        )
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+def _convert_message(message):
+    if isinstance(message, HumanMessage):
+        role = 'user'
+    elif isinstance(message, AIMessage):
+        role = 'assistant'
+    elif isinstance(message, SystemMessage):
+        role = 'system'
+    elif isinstance(message, ChatMessage):
+        role = message.role
+    else:
+        raise ValueError(f"Unsupported message type: {type(message).__name__}")
+    content = message.content
+    if not isinstance(content, str):
+        content = ''.join(part if isinstance(part, str) else part.get('text', '') for part in content)
+    return {'role': role, 'content': content}
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    """
+    Returns the process-wide `OllamaGateway`.
+
+    Like the indexing queue, the gateway lives at module level so it survives Streamlit
+    reruns and cache clears, and is shared by every session of the app.
+
+    Returns:
+        OllamaGateway: The shared gateway.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            _gateway = OllamaGateway()
+        return _gateway
@@ -0,0 +1,202 @@
+import re
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from langchain.chains import ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForChainRun,
+    BaseCallbackHandler,
+    CallbackManagerForChainRun,
+)
+from langchain_core.pydantic_v1 import Field
+
+FOLLOW_UP_PRONOUNS = {
+    'it', "it's", 'its', 'itself', 'they', "they're", 'them', 'their', 'theirs', 'themselves',
+    'those', 'he', 'him', 'his', 'she', 'her', 'hers', 'former', 'latter',
+}
+DEMONSTRATIVES = {'this', 'that', 'these'}
+PRONOUN_FOLLOWERS = {
+    'is', "'s", 'was', 'are', 'were', 'be', 'been', 'do', 'does', 'did', 'mean', 'means', 'meant',
+    'has', 'have', 'had', 'can', 'could', 'will', 'would', 'should', 'may', 'might', 'must',
+    'work', 'works', 'happen', 'happens', 'happened', 'one', 'ones', 'further', 'again', 'in', 'more',
+}
+FOLLOW_UP_PREFIXES = ('and ', 'but ', 'also ', 'so ', 'then ', 'what about', 'how about', 'why not')
+MIN_SELF_CONTAINED_WORDS = 4
+RAW_RESULTS_REUSE_SIMILARITY = 0.8
+
+
+def is_self_contained(question):
+    """
+    Tells whether a question can be understood without the chat history.
+
+    This is a cheap heuristic: short questions, questions starting like a follow-up
+    (e.g. "and the second one?") and questions referring back with a pronoun such as
+    "it" or "those" are considered dependent on the conversation. "this", "that" and
+    "these" only count as a back-reference when they stand alone, i.e. end the question
+    or are followed by a verb ("what does this mean?"), not by a noun ("in this document").
+
+    Args:
+        question (str): The user question.
+
+    Returns:
+        bool: True if the question can be used for retrieval as it is.
+    """
+    text = question.strip().lower()
+    words = re.findall(r"[a-z']+", text)
+    if len(words) < MIN_SELF_CONTAINED_WORDS:
+        return False
+    if text.startswith(FOLLOW_UP_PREFIXES):
+        return False
+    for i, word in enumerate(words):
+        if word in FOLLOW_UP_PRONOUNS:
+            return False
+        if word in DEMONSTRATIVES and (i == len(words) - 1 or words[i + 1] in PRONOUN_FOLLOWERS):
+            return False
+    return True
+
+
+def _word_similarity(first, second):
+    """
+    The Jaccard similarity of the word sets of two questions, ignoring case and punctuation.
+    """
+    first_words = set(re.findall(r"[a-z0-9']+", first.lower()))
+    second_words = set(re.findall(r"[a-z0-9']+", second.lower()))
+    if not first_words and not second_words:
+        return 1.0
+    return len(first_words & second_words) / len(first_words | second_words)
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """
+    A callback handler counting the LLM calls made while it is attached.
+    """
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _increment(self):
+        with self._lock:
+            self.count += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._increment()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self._increment()
+
+
+class FastConversationalRetrievalChain(ConversationalRetrievalChain):
+    """
+    A conversational retrieval chain that avoids the question-condensing LLM call when it can.
+
+    `ConversationalRetrievalChain` rewrites every follow-up question into a standalone one
+    with a full LLM call before retrieving. This chain skips the rewrite on the first turn
+    and for questions that look self-contained, reuses earlier rewrites from a cache, and
+    otherwise retrieves for the raw question while the rewrite is running, so the raw
+    results can be used directly when the rewrite barely changes the question. The number
+    of LLM calls made for the turn is returned under the `llm_calls` key.
+
+    `ainvoke` runs the same synchronous logic on an executor thread, so both paths skip
+    the same rewrites and report `llm_calls`.
+    """
+    skip_self_contained: bool = True
+    """Whether to skip the rewrite for questions that look self-contained."""
+    rewrite_cache: Dict[str, str] = Field(default_factory=dict)
+    """Earlier rewrites, keyed by the chat history and the question."""
+    rewrite_cache_size: int = 256
+    """The number of rewrites kept in `rewrite_cache`."""
+
+    @property
+    def output_keys(self) -> List[str]:
+        return super().output_keys + ['llm_calls']
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        sync_run_manager = run_manager.get_sync() if run_manager else None
+        return await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(self._call, inputs, run_manager=sync_run_manager)
+        )
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        counter = LLMCallCounter()
+        question = inputs["question"]
+        get_chat_history = self.get_chat_history or _get_chat_history
+        chat_history_str = get_chat_history(inputs["chat_history"])
+
+        if not chat_history_str or (self.skip_self_contained and is_self_contained(question)):
+            new_question = question
+            docs = self._get_docs(question, inputs, run_manager=_run_manager)
+        else:
+            cache_key = f"{chat_history_str}\n{question}"
+            new_question = self.rewrite_cache.get(cache_key)
+            if new_question is not None:
+                docs = self._get_docs(new_question, inputs, run_manager=_run_manager)
+            else:
+                new_question, docs = self._rewrite_and_retrieve(
+                    question, chat_history_str, inputs, _run_manager, counter
+                )
+                self._cache_rewrite(cache_key, new_question)
+
+        output: Dict[str, Any] = {}
+        if self.response_if_no_docs_found is not None and len(docs) == 0:
+            output[self.output_key] = self.response_if_no_docs_found
+        else:
+            new_inputs = inputs.copy()
+            if self.rephrase_question:
+                new_inputs["question"] = new_question
+            new_inputs["chat_history"] = chat_history_str
+            callbacks = _run_manager.get_child()
+            callbacks.add_handler(counter)
+            answer = self.combine_docs_chain.run(
+                input_documents=docs, callbacks=callbacks, **new_inputs
+            )
+            output[self.output_key] = answer
+
+        if self.return_source_documents:
+            output["source_documents"] = docs
+        if self.return_generated_question:
+            output["generated_question"] = new_question
+        output["llm_calls"] = counter.count
+        return output
+
+    def _rewrite_and_retrieve(self, question, chat_history_str, inputs, run_manager, counter):
+        """
+        Condenses the question while retrieving for the raw question on a worker thread.
+
+        The raw retrieval runs without callbacks, as the Streamlit callback handler can only
+        write from the script thread. If the rewrite uses nearly the same words as the
+        question, the raw results are used and no second retrieval is needed; otherwise only
+        the results of the rewritten question are used, so the answer keeps the same number
+        of chunks as without the speculative retrieval.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            raw_docs_future = executor.submit(
+                self._get_docs, question, inputs,
+                run_manager=CallbackManagerForChainRun.get_noop_manager()
+            )
+            callbacks = run_manager.get_child()
+            callbacks.add_handler(counter)
+            new_question = self.question_generator.run(
+                question=question, chat_history=chat_history_str, callbacks=callbacks
+            )
+            raw_docs = raw_docs_future.result()
+
+        if _word_similarity(question, new_question) >= RAW_RESULTS_REUSE_SIMILARITY:
+            return new_question, raw_docs
+        return new_question, self._get_docs(new_question, inputs, run_manager=run_manager)
+
+    def _cache_rewrite(self, cache_key, new_question):
+        if len(self.rewrite_cache) >= self.rewrite_cache_size:
+            self.rewrite_cache.pop(next(iter(self.rewrite_cache)))
+        self.rewrite_cache[cache_key] = new_question
@@ -0,0 +1,373 @@
+import threading
+import numpy as np
+from typing import Any, Iterable, List, Optional, Tuple
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+QUANTIZATIONS = (None, 'int8', 'binary')
+SEARCH_BLOCK_SIZE = 8192
+BINARY_QUERY_BLOCK_SIZE = 64
+QUERY_BLOCK_SIZE = 256
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class QuantizedInMemorySearch(VectorStore):
+    """
+    An in-memory vector store searching over quantized embeddings.
+
+    The first pass of every search runs over compact codes kept in RAM: one int8 code per
+    dimension with a per-vector scale ('int8', 4x smaller than float32) or one sign bit per
+    dimension compared by Hamming distance ('binary', 32x smaller). The best
+    `k * rescore_multiplier` candidates are then rescored by cosine similarity using the
+    full-precision embeddings. Those are kept as the arrays handed to `add_embeddings`,
+    so passing arrays memory-mapped from disk keeps them out of RAM entirely. With
+    quantization set to None the store searches the full-precision embeddings directly,
+    which is the baseline used by `recall_at_k`.
+    """
+    def __init__(self, embedding: Embeddings, quantization: Optional[str] = 'int8', rescore_multiplier: int = 4):
+        """
+        Initializes the QuantizedInMemorySearch class.
+
+        Args:
+            embedding (Embeddings): The embedding model used for texts and queries.
+            quantization (str, optional): 'int8', 'binary' or None for no quantization.
+            rescore_multiplier (int, optional): How many candidates per requested result
+                                                are rescored with full precision.
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"quantization must be one of {QUANTIZATIONS}, got {quantization!r}")
+        self.embedding = embedding
+        self.quantization = quantization
+        self.rescore_multiplier = rescore_multiplier
+        self._docs = []
+        self._full_blocks = []
+        self._block_starts = []
+        self._codes = None
+        self._scales = None
+        self._pending_codes = []
+        self._pending_scales = []
+        self._lock = threading.Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        embeddings = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        return self.add_embeddings(texts, embeddings, metadatas)
+
+    def add_embeddings(self, texts, embeddings, metadatas=None):
+        """
+        Adds already embedded texts to the store.
+
+        Args:
+            texts (list): The texts of the chunks.
+            embeddings (np.ndarray): The full-precision embeddings, one row per text. The
+                                     array is kept as is, so it may be memory-mapped.
+            metadatas (list, optional): The metadata of each chunk.
+
+        Returns:
+            list: The ids of the added chunks, which are their positions in the store.
+
+        Raises:
+            ValueError: If there is not exactly one embedding per text.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(texts)} texts")
+        metadatas = metadatas or [{} for _ in texts]
+        codes, scales = self._quantize(embeddings)
+        with self._lock:
+            start = len(self._docs)
+            self._docs.extend(Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas))
+            self._full_blocks.append(embeddings)
+            self._block_starts.append(start)
+            if codes is not None:
+                self._pending_codes.append(codes)
+            if scales is not None:
+                self._pending_scales.append(scales)
+        return [str(i) for i in range(start, start + len(texts))]
+
+    def _quantize(self, embeddings):
+        if self.quantization is None:
+            return None, None
+        vectors = _normalize(embeddings)
+        if self.quantization == 'binary':
+            return np.packbits(vectors > 0, axis=1), None
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def _merge_pending(self):
+        """
+        Appends the codes added since the last search to the contiguous code arrays.
+
+        Adding a batch only queues its codes, so indexing n chunks in batches copies the
+        codes once per search instead of once per batch. Must be called with the lock held.
+        """
+        if self._pending_codes:
+            self._codes = np.concatenate(([] if self._codes is None else [self._codes]) + self._pending_codes)
+            self._pending_codes = []
+        if self._pending_scales:
+            self._scales = np.concatenate(([] if self._scales is None else [self._scales]) + self._pending_scales)
+            self._pending_scales = []
+
+    def _full_rows(self, indices):
+        """
+        Gathers the full-precision embeddings of the given chunk positions.
+        """
+        blocks = np.searchsorted(self._block_starts, indices, side='right') - 1
+        return np.stack([
+            self._full_blocks[b][i - self._block_starts[b]] for b, i in zip(blocks, indices)
+        ]).astype(np.float32)
+
+    def _exact_scores(self, queries):
+        """
+        Cosine similarities of normalized queries against every full-precision embedding.
+        """
+        return np.concatenate([queries @ _normalize(block).T for block in self._full_blocks], axis=1)
+
+    def _first_pass_scores(self, queries):
+        """
+        Approximate similarities of normalized queries against every chunk, higher is better.
+        """
+        if self.quantization is None:
+            return self._exact_scores(queries)
+        self._merge_pending()
+        scores = []
+        if self.quantization == 'binary':
+            query_bits = np.packbits(queries > 0, axis=1)
+            for start in range(0, len(self._codes), SEARCH_BLOCK_SIZE):
+                codes = self._codes[start:start + SEARCH_BLOCK_SIZE]
+                distances = np.concatenate([
+                    _POPCOUNT[codes[None, :, :] ^ bits[:, None, :]].sum(axis=2)
+                    for bits in np.split(query_bits, range(BINARY_QUERY_BLOCK_SIZE, len(query_bits), BINARY_QUERY_BLOCK_SIZE))
+                ])
+                scores.append(-distances.astype(np.float32))
+        else:
+            for start in range(0, len(self._codes), SEARCH_BLOCK_SIZE):
+                codes = self._codes[start:start + SEARCH_BLOCK_SIZE].astype(np.float32)
+                scores.append((queries @ codes.T) * self._scales[start:start + SEARCH_BLOCK_SIZE])
+        return np.concatenate(scores, axis=1)
+
+    def _search(self, queries, k, fetch_k=None):
+        """
+        Runs the quantized first pass and the full-precision rescoring for a batch of queries.
+
+        Args:
+            queries (np.ndarray): The query embeddings, one row per query.
+            k (int): The number of results per query.
+            fetch_k (int, optional): The shortlist size, defaults to `k * rescore_multiplier`.
+
+        Returns:
+            list: For each query, a list of (position, cosine similarity) pairs sorted by
+                  decreasing similarity.
+        """
+        queries = _normalize(np.atleast_2d(queries))
+        with self._lock:
+            n = len(self._docs)
+            if n == 0:
+                return [[] for _ in queries]
+            shortlist_size = min(n, fetch_k or k * self.rescore_multiplier)
+            results = []
+            for start in range(0, len(queries), QUERY_BLOCK_SIZE):
+                block = queries[start:start + QUERY_BLOCK_SIZE]
+                for query, query_scores in zip(block, self._first_pass_scores(block)):
+                    shortlist = np.argpartition(-query_scores, shortlist_size - 1)[:shortlist_size]
+                    rescored = _normalize(self._full_rows(shortlist)) @ query
+                    order = np.argsort(-rescored)[:k]
+                    results.append([(int(shortlist[i]), float(rescored[i])) for i in order])
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        return [(self._docs[i], score) for i, score in self._search(embedding, k)[0]]
+
+    def similarity_search_with_score_by_vectors(self, embeddings, k: int = 4) -> List[List[Tuple[Document, float]]]:
+        """
+        Searches for many query embeddings at once.
+
+        The first pass scores all queries against the store with one matrix operation,
+        which is much faster than searching the queries one by one.
+
+        Args:
+            embeddings (np.ndarray): The query embeddings, one row per query.
+            k (int, optional): The number of results per query.
+
+        Returns:
+            list: For each query, a list of (Document, cosine similarity) pairs.
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.size == 0:
+            return []
+        return [[(self._docs[i], score) for i, score in results] for results in self._search(embeddings, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    def max_marginal_relevance_search(
+        self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding.embed_query(query), k, fetch_k, lambda_mult
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self, embedding: List[float], k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5, **kwargs: Any
+    ) -> List[Document]:
+        results = self.max_marginal_relevance_search_with_score_by_vectors([embedding], k, fetch_k, lambda_mult)
+        return [doc for doc, _ in results[0]]
+
+    def max_marginal_relevance_search_with_score_by_vectors(
+        self, embeddings, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        Runs maximal marginal relevance searches for many query embeddings at once.
+
+        The shortlists of all queries come from one batched first pass, as in
+        `similarity_search_with_score_by_vectors`; only the MMR selection runs per query.
+
+        Args:
+            embeddings (np.ndarray): The query embeddings, one row per query.
+            k (int, optional): The number of results per query.
+            fetch_k (int, optional): The number of candidates MMR selects from.
+            lambda_mult (float, optional): 1 for pure relevance, 0 for maximal diversity.
+
+        Returns:
+            list: For each query, a list of (Document, cosine similarity) pairs in MMR order.
+        """
+        queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+        if queries.size == 0:
+            return []
+        all_candidates = self._search(queries, fetch_k, max(fetch_k, k * self.rescore_multiplier))
+        results = []
+        for query, candidates in zip(np.atleast_2d(queries), all_candidates):
+            if not candidates:
+                results.append([])
+                continue
+            positions = [i for i, _ in candidates]
+            with self._lock:
+                candidate_embeddings = _normalize(self._full_rows(np.array(positions)))
+            selected = maximal_marginal_relevance(query, candidate_embeddings, lambda_mult=lambda_mult, k=k)
+            results.append([(self._docs[positions[i]], candidates[i][1]) for i in selected])
+        return results
+
+    def memory_footprint(self):
+        """
+        Reports the RAM used by the embeddings against an unquantized float32 store.
+
+        Full-precision blocks that are memory-mapped from disk are not counted as RAM.
+
+        Returns:
+            dict: The number of chunks, the bytes of the quantized codes, the bytes of the
+                  full-precision embeddings held in RAM, the bytes a float32 store would use
+                  and the resulting compression ratio.
+        """
+        with self._lock:
+            n = len(self._docs)
+            dims = self._full_blocks[0].shape[1] if self._full_blocks else 0
+            self._merge_pending()
+            quantized_bytes = 0
+            if self._codes is not None:
+                quantized_bytes += self._codes.nbytes
+            if self._scales is not None:
+                quantized_bytes += self._scales.nbytes
+            full_precision_bytes = sum(
+                block.nbytes for block in self._full_blocks if not isinstance(block, np.memmap)
+            )
+        baseline_bytes = n * dims * np.dtype(np.float32).itemsize
+        used_bytes = quantized_bytes + full_precision_bytes
+        return {
+            'chunks': n,
+            'quantization': self.quantization,
+            'quantized_bytes': quantized_bytes,
+            'full_precision_ram_bytes': full_precision_bytes,
+            'baseline_bytes': baseline_bytes,
+            'compression': baseline_bytes / used_bytes if used_bytes else 1.0,
+        }
+
+    def recall_at_k(self, query_embeddings=None, k=4, sample_size=32):
+        """
+        Measures the recall@k of the quantized search against exact full-precision search.
+
+        When no queries are given, a sample of the stored chunk embeddings is used and each
+        query's own chunk is left out of both the exact and the quantized results, as it
+        would otherwise always be found and inflate the recall.
+
+        Args:
+            query_embeddings (np.ndarray, optional): The queries to evaluate. Defaults to a
+                                                     sample of the stored chunk embeddings.
+            k (int, optional): The number of results compared per query.
+            sample_size (int, optional): The number of stored chunks used as queries when
+                                         no queries are given.
+
+        Returns:
+            float: The average fraction of the exact top-k found by the quantized search.
+        """
+        n = len(self._docs)
+        if query_embeddings is None:
+            if n < 2:
+                return 1.0
+            positions = np.linspace(0, n - 1, num=min(sample_size, n)).astype(np.int64)
+            with self._lock:
+                query_embeddings = self._full_rows(positions)
+            k = min(k, n - 1)
+            excluded = positions.tolist()
+        else:
+            if n == 0:
+                return 1.0
+            k = min(k, n)
+            excluded = [None] * len(np.atleast_2d(query_embeddings))
+        queries = _normalize(np.atleast_2d(query_embeddings))
+        with self._lock:
+            exact_scores = self._exact_scores(queries)
+        # Ask for one extra result and one extra shortlisted candidate, so that after
+        # dropping the query's own chunk the search matches a regular k-result search.
+        extra = 1 if excluded[0] is not None else 0
+        found = self._search(queries, k + extra, min(n, k * self.rescore_multiplier + extra))
+        hits = 0
+        for query_scores, results, own in zip(exact_scores, found, excluded):
+            if own is not None:
+                query_scores[own] = -np.inf
+            exact = set(np.argpartition(-query_scores, k - 1)[:k].tolist())
+            quantized = [i for i, _ in results if i != own][:k]
+            hits += len(exact.intersection(quantized))
+        return hits / (k * len(queries))
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        quantization: Optional[str] = 'int8',
+        rescore_multiplier: int = 4,
+        **kwargs: Any,
+    ) -> "QuantizedInMemorySearch":
+        store = cls(embedding, quantization=quantization, rescore_multiplier=rescore_multiplier)
+        store.add_texts(texts, metadatas)
+        return store
@@ -0,0 +1,80 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class MockOllama:
+    """
+    A local HTTP server answering like Ollama's /api/chat and /api/generate endpoints.
+
+    It records every request and the client connection it came on, tracks how many
+    requests are handled at the same time, and holds responses while `release` is clear.
+    """
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = []
+        self.connections = set()
+        self.active = 0
+        self.peak = 0
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def close(self):
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with mock._lock:
+                    mock.requests.append((self.path, body))
+                    mock.connections.add(self.client_address)
+                    mock.active += 1
+                    mock.peak = max(mock.peak, mock.active)
+                mock.release.wait(5)
+                time.sleep(mock.delay)
+                with mock._lock:
+                    mock.active -= 1
+                if self.path == '/api/chat':
+                    chunks = [{'message': {'content': 'Hel'}}, {'message': {'content': 'lo'}}, {'done': True}]
+                else:
+                    chunks = [{'done': True}]
+                data = b''.join(json.dumps(chunk).encode() + b'\n' for chunk in chunks)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+@pytest.fixture
+def mock_ollama():
+    mock = MockOllama()
+    yield mock
+    mock.close()
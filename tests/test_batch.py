@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("numpy")
+
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import src.indexing as indexing
+import src.llm_gateway as llm_gateway
+from paths import Path
+from src.batch import BatchQA, read_questions
+from src.llm_gateway import OllamaGateway
+
+
+class TextLoader:
+    """
+    Stands in for PyPDFLoader, turning every line of a text file into one page.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = [line.strip() for line in f if line.strip()]
+        return [Document(page_content=line, metadata={'source': self.path, 'page': i}) for i, line in enumerate(lines)]
+
+
+def test_read_questions_from_text_skips_empty_lines(tmp_path):
+    path = tmp_path / 'questions.txt'
+    path.write_text("What is the warranty?\n\n  How long is it?  \n", encoding='utf-8')
+
+    assert read_questions(str(path)) == ["What is the warranty?", "How long is it?"]
+
+
+def test_read_questions_from_json_lines(tmp_path):
+    path = tmp_path / 'questions.jsonl'
+    path.write_text('{"question": "What is the warranty?", "id": 1}\n\n{"question": "Who signs?"}\n',
+                    encoding='utf-8')
+
+    assert read_questions(str(path)) == ["What is the warranty?", "Who signs?"]
+
+
+def test_read_questions_from_empty_file(tmp_path):
+    path = tmp_path / 'questions.txt'
+    path.write_text("\n\n", encoding='utf-8')
+
+    assert read_questions(str(path)) == []
+
+
+@pytest.fixture
+def batch_env(monkeypatch, tmp_path, mock_ollama):
+    gateway = OllamaGateway(base_url=mock_ollama.url, max_concurrency=2, keep_alive='5m',
+                            warm_interval=60, queue_timeout=5, request_timeout=5)
+    gateway.warmed = []
+    monkeypatch.setattr(gateway, 'keep_warm', gateway.warmed.append)
+    monkeypatch.setattr(llm_gateway, '_gateway', gateway)
+    monkeypatch.setattr(indexing, '_queue', None)
+    monkeypatch.setattr(indexing, 'get_embedding_model', lambda: DeterministicFakeEmbedding(size=32))
+    monkeypatch.setattr(Path, 'index_cache_path', str(tmp_path / 'index_cache'))
+    monkeypatch.setattr('src.batch.PyPDFLoader', TextLoader)
+    corpus = tmp_path / 'corpus.pdf'
+    corpus.write_text("\n".join(f"Clause {i} of the contract." for i in range(12)), encoding='utf-8')
+    return gateway, mock_ollama, str(corpus)
+
+
+def test_run_answers_every_question_through_the_gateway(batch_env, tmp_path):
+    gateway, mock, corpus = batch_env
+    questions = ["What does clause 1 say?", "What does clause 2 say?", "What does clause 3 say?"]
+    output = tmp_path / 'answers.jsonl'
+
+    summary = BatchQA(k=2, fetch_k=4).run(questions, [corpus], str(output))
+
+    records = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert [record['question'] for record in records] == questions
+    for record in records:
+        assert record['answer'] == 'Hello'
+        assert len(record['sources']) == 2
+        assert len({(source['source'], source['page']) for source in record['sources']}) == 2
+    assert summary['questions'] == 3
+    assert summary['failed'] == 0
+
+    chats = [body for path, body in mock.requests if path == '/api/chat']
+    assert len(chats) == 3
+    assert sorted(q for q in questions if any(q in body['messages'][-1]['content'] for body in chats)) == sorted(questions)
+    assert gateway.warmed == ['llama3.1']
+    assert gateway.metrics()['completed'] == 3
+
+
+def test_run_records_llm_errors(batch_env, tmp_path):
+    gateway, mock, corpus = batch_env
+    mock.close()
+    output = tmp_path / 'answers.jsonl'
+
+    summary = BatchQA().run(["What does clause 1 say?"], [corpus], str(output))
+
+    record = json.loads(output.read_text(encoding='utf-8'))
+    assert 'error' in record
+    assert 'answer' not in record
+    assert summary['failed'] == 1
+
+
+def test_run_rejects_empty_questions(batch_env, tmp_path):
+    with pytest.raises(ValueError):
+        BatchQA().run([], [batch_env[2]], str(tmp_path / 'answers.jsonl'))
@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+np = pytest.importorskip("numpy")
+
+from langchain_core.documents.base import Document
+from langchain_core.embeddings import Embeddings
+
+import src.indexing as indexing
+from paths import Path
+from src.indexing import CANCELLED, DONE, IndexingQueue, JobRetriever
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    A deterministic embedder recording how many texts it embedded.
+
+    While `gate` is clear, every call to `embed_documents` blocks until it is set.
+    """
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.embedded = 0
+        self.gate = threading.Event()
+        self.gate.set()
+        self.waiting = threading.Event()
+
+    def _embed(self, text):
+        rng = np.random.default_rng(abs(hash(text)) % (2 ** 32))
+        return rng.standard_normal(self.dim).tolist()
+
+    def embed_documents(self, texts):
+        self.waiting.set()
+        self.gate.wait(5)
+        self.embedded += len(texts)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class DocumentLoader:
+    def __init__(self, count=10, prefix='chunk'):
+        self.calls = 0
+        self.count = count
+        self.prefix = prefix
+
+    def __call__(self):
+        self.calls += 1
+        return [Document(page_content=f'{self.prefix} {i}', metadata={'page': i}) for i in range(self.count)]
+
+
+@pytest.fixture
+def embedder(monkeypatch, tmp_path):
+    fake = FakeEmbeddings()
+    monkeypatch.setattr(indexing, 'get_embedding_model', lambda: fake)
+    monkeypatch.setattr(Path, 'index_cache_path', str(tmp_path))
+    monkeypatch.setattr(Path, 'indexing_batch_size', 4)
+    monkeypatch.setattr(Path, 'indexing_max_jobs', 8)
+    return fake
+
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.is_active:
+        assert time.monotonic() < deadline, "job did not finish in time"
+        time.sleep(0.005)
+
+
+def generations(key):
+    return sorted(os.listdir(os.path.join(Path.index_cache_path, key)))
+
+
+def test_same_content_is_indexed_once(embedder):
+    queue = IndexingQueue(max_workers=1)
+    loader = DocumentLoader()
+    job = queue.submit('key', loader)
+    assert queue.submit('key', loader) is job
+    wait_for(job)
+
+    assert job.status == DONE
+    assert job.indexed == job.total == 10
+    assert loader.calls == 1
+    assert embedder.embedded == 10
+    assert job.finished_at is not None
+
+
+def test_store_is_created_by_the_worker(embedder):
+    embedder.gate.clear()
+    queue = IndexingQueue(max_workers=1)
+    job = queue.submit('key', DocumentLoader())
+    assert embedder.waiting.wait(5)
+    assert job.vectordb is not None
+    embedder.gate.set()
+    wait_for(job)
+
+    assert [doc.page_content for doc in job.vectordb.similarity_search('chunk 3', k=1)] == ['chunk 3']
+
+
+def test_cancelled_job_resumes_from_the_last_batch(embedder):
+    embedder.gate.clear()
+    queue = IndexingQueue(max_workers=1)
+    job = queue.submit('key', DocumentLoader())
+    assert embedder.waiting.wait(5)
+    job.cancel()
+    embedder.gate.set()
+    wait_for(job)
+
+    assert job.status == CANCELLED
+    assert job.indexed == 4
+
+    resumed = queue.resume(job)
+    wait_for(resumed)
+
+    assert resumed is not job
+    assert queue.get('key') is resumed
+    assert resumed.status == DONE
+    assert resumed.indexed == 10
+    assert embedder.embedded == 10
+
+
+def test_evicted_job_is_reloaded_without_embedding(embedder, monkeypatch):
+    monkeypatch.setattr(Path, 'indexing_max_jobs', 1)
+    queue = IndexingQueue(max_workers=1)
+    first = queue.submit('first', DocumentLoader(prefix='first'))
+    wait_for(first)
+    second = queue.submit('second', DocumentLoader(prefix='second'))
+    wait_for(second)
+
+    assert queue.get('first') is None
+    assert queue.get('second') is second
+
+    loader = DocumentLoader(prefix='first')
+    reloaded = queue.submit('first', loader)
+    wait_for(reloaded)
+
+    assert reloaded.status == DONE
+    assert reloaded.indexed == 10
+    assert reloaded.finished_at == first.finished_at
+    assert loader.calls == 0
+    assert embedder.embedded == 20
+
+
+def test_batch_size_change_embeds_again(embedder, monkeypatch):
+    queue = IndexingQueue(max_workers=1)
+    job = queue.submit('key', DocumentLoader())
+    wait_for(job)
+
+    monkeypatch.setattr(Path, 'indexing_batch_size', 3)
+    other = IndexingQueue(max_workers=1)
+    reloaded = other.submit('key', DocumentLoader())
+    wait_for(reloaded)
+
+    assert reloaded.indexed == 10
+    assert embedder.embedded == 20
+    for doc in reloaded.vectordb.similarity_search('chunk 7', k=1):
+        assert doc.page_content == 'chunk 7'
+
+
+def test_stale_job_is_refreshed_in_the_background(embedder):
+    queue = IndexingQueue(max_workers=1)
+    old = queue.submit('key', DocumentLoader(prefix='old'), ttl=3600)
+    wait_for(old)
+    old_generation = old.generation
+    assert queue.submit('key', DocumentLoader(prefix='new'), ttl=3600) is old
+
+    old.finished_at -= 3600
+    embedder.gate.clear()
+    assert queue.submit('key', DocumentLoader(prefix='new'), ttl=3600) is old
+    assert embedder.waiting.wait(5)
+    assert queue.get('key') is old
+    assert queue.submit('key', DocumentLoader(prefix='new'), ttl=3600) is old
+
+    retriever = JobRetriever(key='key', search_kwargs={'k': 1, 'fetch_k': 2}, queue=queue)
+    assert retriever.invoke('old 1')[0].page_content.startswith('old')
+
+    embedder.gate.set()
+    deadline = time.monotonic() + 5
+    while queue.get('key') is old:
+        assert time.monotonic() < deadline, "refresh was not swapped in"
+        time.sleep(0.005)
+
+    new = queue.get('key')
+    assert new.status == DONE
+    assert new.generation != old_generation
+    assert generations('key') == [new.generation]
+    assert retriever.invoke('new 1')[0].page_content.startswith('new')
+
+
+def test_failed_refresh_keeps_the_old_job(embedder):
+    queue = IndexingQueue(max_workers=1)
+    old = queue.submit('key', DocumentLoader(), ttl=3600)
+    wait_for(old)
+    old.finished_at -= 3600
+
+    queue.submit('key', DocumentLoader(count=0), ttl=3600)
+    deadline = time.monotonic() + 5
+    while 'key' in queue._refreshing:
+        assert time.monotonic() < deadline, "refresh did not finish"
+        time.sleep(0.005)
+
+    assert queue.get('key') is old
+    assert not old.is_stale(3600)
+    assert generations('key') == [old.generation]
+
+
+def test_retriever_without_chunks_returns_nothing(embedder):
+    queue = IndexingQueue(max_workers=1)
+    assert JobRetriever(key='missing', queue=queue).invoke('anything') == []
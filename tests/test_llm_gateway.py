@@ -0,0 +1,125 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from src.llm_gateway import GatewayTimeout, OllamaGateway
+
+
+def make_gateway(mock, max_concurrency=2):
+    return OllamaGateway(base_url=mock.url, max_concurrency=max_concurrency, keep_alive='5m',
+                         warm_interval=60, queue_timeout=5, request_timeout=5)
+
+
+def ask(gateway, content, priority=0, timeout=None):
+    return gateway.chat('llama3.1', [{'role': 'user', 'content': content}], priority=priority, timeout=timeout)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.005)
+
+
+def test_chat_streams_tokens_and_sends_keep_alive(mock_ollama):
+    gateway = make_gateway(mock_ollama)
+    tokens = []
+    answer = gateway.chat('llama3.1', [{'role': 'user', 'content': 'hi'}], on_token=tokens.append)
+
+    assert answer == 'Hello'
+    assert tokens == ['Hel', 'lo']
+    path, body = mock_ollama.requests[0]
+    assert path == '/api/chat'
+    assert body['keep_alive'] == '5m'
+    assert body['stream'] is True
+
+
+def test_connections_are_reused(mock_ollama):
+    gateway = make_gateway(mock_ollama)
+    for i in range(5):
+        ask(gateway, str(i))
+
+    assert len(mock_ollama.requests) == 5
+    assert len(mock_ollama.connections) == 1
+
+
+def test_concurrency_is_bounded(mock_ollama):
+    mock_ollama.delay = 0.05
+    gateway = make_gateway(mock_ollama, max_concurrency=2)
+    threads = [threading.Thread(target=ask, args=(gateway, str(i))) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(mock_ollama.requests) == 6
+    assert mock_ollama.peak == 2
+    assert len(mock_ollama.connections) <= 2
+
+
+def test_waiting_requests_are_served_by_priority(mock_ollama):
+    gateway = make_gateway(mock_ollama, max_concurrency=1)
+    mock_ollama.release.clear()
+    threads = [threading.Thread(target=ask, args=(gateway, 'first'))]
+    threads[0].start()
+    wait_until(lambda: mock_ollama.active == 1)
+
+    for content, priority in [('low-1', 10), ('low-2', 10), ('high-1', 0), ('high-2', 0)]:
+        depth = gateway.metrics()['queue_depth']
+        thread = threading.Thread(target=ask, args=(gateway, content, priority))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: gateway.metrics()['queue_depth'] == depth + 1)
+
+    mock_ollama.release.set()
+    for thread in threads:
+        thread.join()
+
+    order = [body['messages'][0]['content'] for _, body in mock_ollama.requests]
+    assert order == ['first', 'high-1', 'high-2', 'low-1', 'low-2']
+
+
+def test_queue_timeout_raises(mock_ollama):
+    gateway = make_gateway(mock_ollama, max_concurrency=1)
+    mock_ollama.release.clear()
+    blocking = threading.Thread(target=ask, args=(gateway, 'first'))
+    blocking.start()
+    wait_until(lambda: mock_ollama.active == 1)
+
+    with pytest.raises(GatewayTimeout):
+        ask(gateway, 'second', timeout=0.05)
+    mock_ollama.release.set()
+    blocking.join()
+
+    metrics = gateway.metrics()
+    assert metrics['timeouts'] == 1
+    assert metrics['queue_depth'] == 0
+    assert metrics['completed'] == 1
+
+
+def test_warm_up_loads_the_model(mock_ollama):
+    gateway = make_gateway(mock_ollama)
+    gateway.warm_up('llama3.1')
+
+    path, body = mock_ollama.requests[0]
+    assert path == '/api/generate'
+    assert body == {'model': 'llama3.1', 'keep_alive': '5m'}
+
+
+def test_metrics_report_wait_times(mock_ollama):
+    gateway = make_gateway(mock_ollama, max_concurrency=1)
+    mock_ollama.delay = 0.05
+    threads = [threading.Thread(target=ask, args=(gateway, str(i))) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    metrics = gateway.metrics()
+    assert metrics['completed'] == 3
+    assert metrics['in_flight'] == 0
+    assert metrics['wait_max'] >= 0.05
+    assert metrics['wait_mean'] <= metrics['wait_p95'] <= metrics['wait_max']
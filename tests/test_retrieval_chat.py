@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langchain")
+
+from langchain.memory import ConversationBufferMemory
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.retrievers import BaseRetriever
+
+from src.retrieval_chat import FastConversationalRetrievalChain, _word_similarity, is_self_contained
+
+
+@pytest.mark.parametrize("question", [
+    "What is the total revenue reported in this document?",
+    "Is there a warranty clause in the contract?",
+    "Explain the algorithm that the authors propose.",
+    "How many more employees were hired in 2023?",
+    "Which one of the three models performs best?",
+])
+def test_standalone_questions_are_self_contained(question):
+    assert is_self_contained(question)
+
+
+@pytest.mark.parametrize("question", [
+    "and the second?",
+    "Why?",
+    "What about the pricing section?",
+    "How does it compare to the baseline?",
+    "Can you summarize those results for me?",
+    "What does this mean in practice?",
+    "Could you explain that in more detail?",
+    "Who wrote the report about that",
+])
+def test_follow_up_questions_are_not_self_contained(question):
+    assert not is_self_contained(question)
+
+
+def test_word_similarity_ignores_case_and_punctuation():
+    assert _word_similarity("What is the refund policy?", "what is the Refund policy") == 1.0
+    assert _word_similarity("What is its price?", "What is the price of the X200 laptop?") < 0.8
+
+
+class RecordingRetriever(BaseRetriever):
+    """
+    A retriever returning one document per query and recording the queries it received.
+    """
+    queries: list = []
+
+    def _get_relevant_documents(self, query, *, run_manager: CallbackManagerForRetrieverRun):
+        self.queries.append(query)
+        return [Document(page_content=f"about {query}")]
+
+
+def make_chain(rewrites=()):
+    """
+    Builds a chain whose condensing LLM returns `rewrites` in order and whose answering LLM
+    always answers "answer".
+    """
+    retriever = RecordingRetriever(queries=[])
+    chain = FastConversationalRetrievalChain.from_llm(
+        llm=FakeListLLM(responses=["answer"]),
+        retriever=retriever,
+        condense_question_llm=FakeListLLM(responses=list(rewrites) or ["unused"]),
+        memory=ConversationBufferMemory(memory_key='chat_history', output_key='answer', return_messages=True),
+        return_source_documents=True,
+        return_generated_question=True,
+    )
+    return chain, retriever
+
+
+def test_first_turn_skips_the_rewrite():
+    chain, retriever = make_chain()
+    result = chain.invoke({"question": "what is it?"})
+
+    assert result["answer"] == "answer"
+    assert result["llm_calls"] == 1
+    assert result["generated_question"] == "what is it?"
+    assert retriever.queries == ["what is it?"]
+
+
+def test_self_contained_follow_up_skips_the_rewrite():
+    chain, retriever = make_chain()
+    chain.invoke({"question": "What does the contract say about payments?"})
+    result = chain.invoke({"question": "Is there a warranty clause in the contract?"})
+
+    assert result["llm_calls"] == 1
+    assert retriever.queries[-1] == "Is there a warranty clause in the contract?"
+
+
+def test_dependent_follow_up_is_rewritten():
+    chain, retriever = make_chain(rewrites=["What is the warranty period of the product?"])
+    chain.invoke({"question": "Is there a warranty clause in the contract?"})
+    result = chain.invoke({"question": "how long is it?"})
+
+    assert result["llm_calls"] == 2
+    assert result["generated_question"] == "What is the warranty period of the product?"
+    assert retriever.queries[-2:] == ["how long is it?", "What is the warranty period of the product?"]
+    assert [doc.page_content for doc in result["source_documents"]] == [
+        "about What is the warranty period of the product?"
+    ]
+
+
+def test_near_identical_rewrite_reuses_the_raw_results():
+    chain, retriever = make_chain(rewrites=["and the second one?"])
+    chain.invoke({"question": "Is there a warranty clause in the contract?"})
+    result = chain.invoke({"question": "and the second one?"})
+
+    assert result["llm_calls"] == 2
+    assert retriever.queries[-1] == "and the second one?"
+    assert retriever.queries.count("and the second one?") == 1
+
+
+def test_cached_rewrite_skips_the_llm_call():
+    chain, retriever = make_chain(rewrites=["What is the warranty period of the product?"])
+    inputs = {"question": "how long is it?", "chat_history": [("Is there a warranty?", "Yes.")]}
+    first = chain._call(inputs)
+    second = chain._call(inputs)
+
+    assert first["llm_calls"] == 2
+    assert second["llm_calls"] == 1
+    assert second["generated_question"] == "What is the warranty period of the product?"
+
+
+def test_ainvoke_reports_llm_calls():
+    chain, _ = make_chain(rewrites=["What is the warranty period of the product?"])
+    asyncio.run(chain.ainvoke({"question": "Is there a warranty clause in the contract?"}))
+    result = asyncio.run(chain.ainvoke({"question": "how long is it?"}))
+
+    assert result["answer"] == "answer"
+    assert result["llm_calls"] == 2
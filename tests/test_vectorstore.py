@@ -0,0 +1,111 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+np = pytest.importorskip("numpy")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from src.vectorstore import QuantizedInMemorySearch
+
+DIM = 64
+BATCH = 32
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    rng = np.random.default_rng(0)
+    centers = rng.standard_normal((50, DIM))
+    vectors = centers[rng.integers(0, 50, 2000)] + 0.5 * rng.standard_normal((2000, DIM))
+    queries = centers[rng.integers(0, 50, 50)] + 0.5 * rng.standard_normal((50, DIM))
+    return vectors.astype(np.float32), queries.astype(np.float32)
+
+
+def make_store(vectors, quantization, rescore_multiplier=4, blocks=None):
+    store = QuantizedInMemorySearch(DeterministicFakeEmbedding(size=DIM), quantization=quantization,
+                                    rescore_multiplier=rescore_multiplier)
+    for start in range(0, len(vectors), BATCH):
+        block = vectors[start:start + BATCH] if blocks is None else blocks[start // BATCH]
+        store.add_embeddings([f'chunk {i}' for i in range(start, start + len(block))], block)
+    return store
+
+
+def top_k(store, queries, k=4):
+    return [{doc.page_content for doc, _ in results}
+            for results in store.similarity_search_with_score_by_vectors(queries, k)]
+
+
+@pytest.mark.parametrize("quantization, rescore_multiplier, min_recall", [
+    ('int8', 4, 0.95),
+    ('binary', 10, 0.9),
+])
+def test_quantized_search_matches_full_precision(corpus, quantization, rescore_multiplier, min_recall):
+    vectors, queries = corpus
+    exact = top_k(make_store(vectors, None), queries)
+    found = top_k(make_store(vectors, quantization, rescore_multiplier), queries)
+
+    recall = sum(len(e & f) for e, f in zip(exact, found)) / (4 * len(queries))
+    assert recall >= min_recall
+
+
+def test_recall_at_k_leaves_out_the_query_chunk(corpus):
+    vectors, queries = corpus
+    store = make_store(vectors, 'int8')
+
+    assert store.recall_at_k() >= 0.95
+    assert store.recall_at_k(queries) >= 0.95
+    assert make_store(vectors, None).recall_at_k() == 1.0
+
+
+@pytest.mark.parametrize("quantization, compression", [
+    ('int8', 4 * DIM / (DIM + 4)),
+    ('binary', 32.0),
+])
+def test_memory_mapped_blocks_are_not_held_in_ram(corpus, tmp_path, quantization, compression):
+    vectors, _ = corpus
+    blocks = []
+    for start in range(0, len(vectors), BATCH):
+        path = tmp_path / f'batch_{start}.npy'
+        np.save(path, vectors[start:start + BATCH])
+        blocks.append(np.load(path, mmap_mode='r'))
+    footprint = make_store(vectors, quantization, blocks=blocks).memory_footprint()
+
+    assert footprint['chunks'] == len(vectors)
+    assert footprint['full_precision_ram_bytes'] == 0
+    assert footprint['baseline_bytes'] == vectors.nbytes
+    assert footprint['compression'] == pytest.approx(compression)
+
+
+def test_codes_added_in_batches_match_one_add(corpus):
+    vectors, _ = corpus
+    batched = make_store(vectors, 'int8')
+    whole = QuantizedInMemorySearch(DeterministicFakeEmbedding(size=DIM))
+    whole.add_embeddings([f'chunk {i}' for i in range(len(vectors))], vectors)
+    batched.memory_footprint()
+    whole.memory_footprint()
+
+    np.testing.assert_array_equal(batched._codes, whole._codes)
+    np.testing.assert_array_equal(batched._scales, whole._scales)
+
+
+def test_add_embeddings_rejects_mismatched_lengths(corpus):
+    vectors, _ = corpus
+    store = QuantizedInMemorySearch(DeterministicFakeEmbedding(size=DIM))
+    with pytest.raises(ValueError):
+        store.add_embeddings(['a', 'b'], vectors[:3])
+
+
+def test_mmr_prefers_diverse_chunks():
+    rng = np.random.default_rng(1)
+    base = rng.standard_normal(DIM).astype(np.float32)
+    other = rng.standard_normal(DIM).astype(np.float32)
+    vectors = np.stack([base, base + 0.01, base + 0.02, 0.6 * base + 0.8 * other])
+    store = QuantizedInMemorySearch(DeterministicFakeEmbedding(size=DIM))
+    store.add_embeddings(['first', 'duplicate', 'near duplicate', 'different'], vectors)
+    query = base + 0.3 * other
+
+    similar = [doc.page_content for doc in store.similarity_search_by_vector(query, k=2)]
+    diverse = [doc.page_content for doc in store.max_marginal_relevance_search_by_vector(query, k=2, fetch_k=4)]
+
+    assert 'different' not in similar
+    assert diverse[0] in ('first', 'duplicate', 'near duplicate')
+    assert 'different' in diverse